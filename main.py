@@ -16,38 +16,54 @@ License: NA
 """
 
 #import necessary functions
-import os; import json; import time; os.system('cls') #clear terminal
-import numpy as np; import matplotlib.pyplot as plt; from numpy.polynomial.polynomial import Polynomial
-from nptdms import TdmsFile; import nidaqmx
-from datetime import datetime; from zoneinfo import ZoneInfo
-from nidaqmx.constants import (READ_ALL_AVAILABLE,AcquisitionType,LoggingMode,LoggingOperation)
+import os; import json; import time
+import numpy as np; import matplotlib.pyplot as plt
+import nidaqmx
+from datetime import datetime; from zoneinfo import ZoneInfo; from functools import lru_cache; from collections import namedtuple
+from nidaqmx.constants import AcquisitionType; from nidaqmx.stream_readers import AnalogMultiChannelReader, AnalogSingleChannelReader
 plt.rcParams['font.family'] = 'Times New Roman' #set desired font
+plt.rcParams['path.simplify_threshold'] = 1.0 #merge line segments that would render within the same pixel
+plt.rcParams['agg.path.chunksize'] = 10000 #draw long paths in chunks rather than one very long path
 
-default_config_json = {"DAQ_config":{"DAQ_name":"myDAQ1","load_cell_channel":"ai0","ultrasonic_channel":"ai1"},"test_config":{"sampling_rate_hz":1000,"min_sampling_rate_hz":1,"max_sampling_rate_hz":200000,"test_duration_ms":5000,"min_test_duration_ms":1,"max_test_duration_ms":10000},"load_cell":{"calibration_date":"2025-03-25T14:54:36.456188-06:00","calibration_masses_kg":[0,0.1,0.2,0.3,0.4,0.5],"calibration_voltages":[2.385856775974389,2.3796618783380836,2.3796618783380836,2.385204681486357,2.384878634242341,2.384552586998325],"calibration_frequency_hz":100,"minimum_data_variation_warning":0.05},"ultrasonic":{"calibration_date":"2025-02-27T13:56:12.205858-07:00","calibration_distances_m":[0.25,0.5,0.75,1,1.25],"calibration_voltages":[0.5430377527954988,1.9963933429971803,3.4684966497297864,5.007765688729705,6.548012869461672],"calibration_frequency_hz":100,"minimum_data_variation_warning":0.05}}
+# Clear the terminal with ANSI escape codes instead of spawning a 'cls' process on every redraw
+def clear_terminal():
+    print("\033[2J\033[H", end="", flush=True)
 
-# Get inputs from .json file
-try:
-    with open('config.json') as f: config_data = json.load(f)  # Get calibration data from .json file
-except FileNotFoundError: # Handle config.json not found
-    print("Error: 'config.json' file not found. Creating config.json file using default settings."); time.sleep(3)
-    config_data = default_config_json
-    with open('config.json', 'w') as f: json.dump(config_data, f, indent=4) # Write the updated JSON data back to the file
-except json.JSONDecodeError: # Handle config.json decode error
-    print("Error: 'config.json' contains invalid JSON. Creating new config.json file using default settings."); time.sleep(3)
-    config_data = default_config_json
+default_config_json = {"DAQ_config":{"DAQ_name":"myDAQ1","load_cell_channel":"ai0","ultrasonic_channel":"ai1","load_cell_min_voltage_v":-10,"load_cell_max_voltage_v":10,"ultrasonic_min_voltage_v":-10,"ultrasonic_max_voltage_v":10},"test_config":{"sampling_rate_hz":1000,"min_sampling_rate_hz":1,"max_sampling_rate_hz":200000,"test_duration_ms":5000,"min_test_duration_ms":1,"max_test_duration_ms":10000},"load_cell":{"calibration_date":"2025-03-25T14:54:36.456188-06:00","calibration_masses_kg":[0,0.1,0.2,0.3,0.4,0.5],"calibration_voltages":[2.385856775974389,2.3796618783380836,2.3796618783380836,2.385204681486357,2.384878634242341,2.384552586998325],"calibration_frequency_hz":100,"minimum_data_variation_warning":0.05},"ultrasonic":{"calibration_date":"2025-02-27T13:56:12.205858-07:00","calibration_distances_m":[0.25,0.5,0.75,1,1.25],"calibration_voltages":[0.5430377527954988,1.9963933429971803,3.4684966497297864,5.007765688729705,6.548012869461672],"calibration_frequency_hz":100,"minimum_data_variation_warning":0.05}}
+
+# Write config_data back to config.json (indented so it stays readable for manual edits)
+def save_config():
     with open('config.json', 'w') as f: json.dump(config_data, f, indent=4) # Write the updated JSON data back to the file
-    
+
+# Get inputs from .json file into config_data, recreating config.json from the defaults if it is missing or invalid
+def load_config():
+    global config_data
+    try:
+        with open('config.json') as f: config_data = json.load(f)  # Get calibration data from .json file
+    except FileNotFoundError: # Handle config.json not found
+        print("Error: 'config.json' file not found. Creating config.json file using default settings."); input("Press Enter to continue...")
+        config_data = default_config_json
+        save_config()
+    except json.JSONDecodeError: # Handle config.json decode error
+        print("Error: 'config.json' contains invalid JSON. Creating new config.json file using default settings."); input("Press Enter to continue...")
+        config_data = default_config_json
+        save_config()
+
+config_data = default_config_json # Replaced with the contents of config.json by load_config() when the program starts
 
 # Function to edit settings
 def settings():
+    unsaved_changes = False # Edits are written to config.json once when leaving the settings menu
     while True:
-        os.system('cls') #clear terminal
+        clear_terminal() #clear terminal
         
         # Permenanent settings
         print("DAQ Settings: (edit config.json file to change)")
         print("  DAQ Name:",config_data['DAQ_config']['DAQ_name'])
         print("  Load Cell Channel:",config_data['DAQ_config']['load_cell_channel'])
         print("  Ultrasonic Channel:",config_data['DAQ_config']['ultrasonic_channel'])
+        print("  Load Cell Input Range:","%g to %g V" % sensor_input_range('load_cell'))
+        print("  Ultrasonic Input Range:","%g to %g V" % sensor_input_range('ultrasonic'))
 
         # Print options for user
         print("\nTensile Test Settings: (select option to edit or exit settings)")
@@ -58,7 +74,9 @@ def settings():
         choice = input("Enter your choice (1/2/3): ").strip()
 
         # Edit Testing Frequency
-        if choice.lower() == "exit": print("\nExiting program.\n"); exit()  # Close program
+        if choice.lower() == "exit":
+            if unsaved_changes: save_config()
+            print("\nExiting program.\n"); exit()  # Close program
         elif choice == "1": 
             while True:
                 try:
@@ -66,7 +84,7 @@ def settings():
                     if config_data['test_config']['min_sampling_rate_hz'] <= new_frequency <= config_data['test_config']['max_sampling_rate_hz']: # Check that the frequency is in desired range
                         config_data['test_config']['sampling_rate_hz'] = new_frequency # Store entered frequency into internal config file
                         print("\nTest frequency has been updated\n"); time.sleep(1) # Print message and give user time to read it
-                        with open('config.json', 'w') as f: json.dump(config_data, f, indent=4) # Write the updated JSON data back to the file
+                        unsaved_changes = True
                         break
                     else:
                         print("\nInvalid frequency entered. Please enter a frequency between",config_data['test_config']['min_sampling_rate_hz'],"and",config_data['test_config']['max_sampling_rate_hz'], "Hz")
@@ -81,7 +99,7 @@ def settings():
                     if config_data['test_config']['min_test_duration_ms'] <= new_duration <= config_data['test_config']['max_test_duration_ms']: # Check that the duration is in desired range
                         config_data['test_config']['test_duration_ms'] = new_duration
                         print("\nTest duration has been updated\n"); time.sleep(1) # Print message and give user time to read it
-                        with open('config.json', 'w') as f: json.dump(config_data, f, indent=4) # Write the updated JSON data back to the file
+                        unsaved_changes = True
                         break
                     else:
                         print("\nInvalid duration entered. Please enter a duration between",config_data['test_config']['min_test_duration_ms'], "and",config_data['test_config']['max_test_duration_ms'],"ms")
@@ -90,142 +108,216 @@ def settings():
 
         # Exit Settings Menu
         elif choice == "3":
+            if unsaved_changes: save_config()
             print("\nReturning to main menu.\n")
             break
         else: print("\nInvalid choice. Please enter 1, 2, or 3.\n") # Error if invalid choice is selected
     return 0
 
-def moving_average(data, window_size):
+# Moving average computed from a running sum, O(n) regardless of window size
+# Pass out (which may be data itself) to write the result into an existing array instead of allocating one
+def moving_average(data, window_size, out=None):
     if window_size > len(data): raise ValueError("Window size cannot exceed data length.")
     if window_size <= 0: raise ValueError("Window size must be positive.")
+    if window_size == 1: # Averaging over one sample leaves the data unchanged
+        if out is None: return np.array(data, dtype=np.float64)
+        out[...] = data; return out
       
-    kernel = np.ones(window_size) / window_size
-    smoothed_data = np.convolve(data, kernel, mode='same')
+    padded = np.pad(np.asarray(data, dtype=np.float64), (window_size // 2, (window_size - 1) // 2), mode='edge') # Repeat the end samples so the edges are not pulled toward zero
+    cumulative = np.cumsum(np.concatenate(([0.0], padded))) # Leading zero so every window sum is a difference of two entries
+    smoothed_data = np.subtract(cumulative[window_size:], cumulative[:-window_size], out=out) # Sum of each window is the difference of two running sums
+    smoothed_data /= window_size
     return smoothed_data
 
+# Return a sensor's (min, max) input range in volts from config.json, defaulting to the myDAQ's full +/-10 V range
+def sensor_input_range(sensor):
+    daq_config = config_data['DAQ_config']
+    return daq_config.get(sensor+'_min_voltage_v', -10), daq_config.get(sensor+'_max_voltage_v', 10)
+
+# Add a voltage channel for a sensor ('load_cell' or 'ultrasonic') using the DAQ name, channel, and input range from config.json
+# A range matching the sensor output lets the driver pick the narrowest ADC range that fits (+/-2 V or +/-10 V on the myDAQ)
+def add_sensor_channel(task, sensor):
+    daq_config = config_data['DAQ_config']
+    min_voltage, max_voltage = sensor_input_range(sensor)
+    task.ai_channels.add_ai_voltage_chan(daq_config['DAQ_name']+"/"+daq_config[sensor+'_channel'], min_val=min_voltage, max_val=max_voltage)
+
+# Median via partitioning (O(n) introselect) rather than the full sort done by np.median
+# Note: a float64 array passed in is reordered in place to avoid a copy, so only pass scratch buffers
+def fast_median(data):
+    data = np.asarray(data, dtype=np.float64)
+    k = data.size // 2
+    if data.size % 2:
+        data.partition(k)
+        return data[k] # Odd number of samples, middle value is the median
+    data.partition((k - 1, k)) # Place both middle values in one pass
+    return 0.5 * (data[k - 1] + data[k]) # Even number of samples, average the two middle values
+
+# Reduce a trace to the min and max of each of n_out buckets so plots keep their peaks without drawing every sample
+def minmax_decimate(x, y, n_out=5000):
+    n = len(y)
+    if n <= 2 * n_out: return x, y # Already small enough to plot directly
+    bucket_size = n // n_out
+    buckets = y[:bucket_size * n_out].reshape(n_out, bucket_size)
+    offsets = np.arange(n_out) * bucket_size
+    tail = y[bucket_size * n_out:] # Samples left over after the last full bucket
+    tail_idx = bucket_size * n_out + np.array([np.argmin(tail), np.argmax(tail)]) if tail.size else np.array([], dtype=int)
+    idx = np.unique(np.concatenate((offsets + np.argmin(buckets, axis=1), offsets + np.argmax(buckets, axis=1), tail_idx))) # Sorted, without duplicates
+    return x[idx], y[idx]
+
 #function to calibrate ultrasonic sensor
 def calibrate_ultrasonic():
-    os.system('cls') #clear terminal
+    clear_terminal() #clear terminal
     print("Calibrating ultrasonic sensor.")
     
-    for i in range(len(config_data['ultrasonic']['calibration_distances_m'])):
-        while True:
-            print("\nPlace object",config_data['ultrasonic']['calibration_distances_m'][i]*1000,"mm away from ultrasonic sensor.")
-            choice = input("Press 'y' when ready or 'c' to cancel: ").strip()
-            
-            # get 1 second of data from DAQ for calibration
-            if choice.lower() == "exit": print("\nExiting program.\n"); exit()  # Close program
-            elif choice in ['y', 'Y']: 
-                with nidaqmx.Task() as task:
-                    freq = np.round(config_data['ultrasonic']['calibration_frequency_hz']).astype(int) #get desired frequency from input file
-                    task.ai_channels.add_ai_voltage_chan("myDAQ1/ai1") #create task to record ultrasonic voltage
-                    task.timing.cfg_samp_clk_timing(freq, samps_per_chan=freq) #configure task frequency and number of samples
-                    calib_val = np.median(np.array(task.read(freq))) #set calibration voltage to median of collected data
+    # Create the DAQ task once and reuse it for every calibration point
+    with nidaqmx.Task() as task:
+        freq = int(round(config_data['ultrasonic']['calibration_frequency_hz'])) #get desired frequency from input file
+        add_sensor_channel(task, 'ultrasonic') #create task to record ultrasonic voltage
+        task.timing.cfg_samp_clk_timing(freq, samps_per_chan=freq) #configure task frequency and number of samples
+        reader = AnalogSingleChannelReader(task.in_stream)
+        samples = np.empty(freq, dtype=np.float64) #buffer reused for every calibration point
+
+        for i in range(len(config_data['ultrasonic']['calibration_distances_m'])):
+            while True:
+                print("\nPlace object",config_data['ultrasonic']['calibration_distances_m'][i]*1000,"mm away from ultrasonic sensor.")
+                choice = input("Press 'y' when ready or 'c' to cancel: ").strip()
+                
+                # get 1 second of data from DAQ for calibration
+                if choice.lower() == "exit": print("\nExiting program.\n"); exit()  # Close program
+                elif choice in ['y', 'Y']: 
+                    reader.read_many_sample(samples, number_of_samples_per_channel=freq) #read straight into the buffer rather than through a Python list
+                    calib_val = fast_median(samples) #set calibration voltage to median of collected data
                     config_data['ultrasonic']['calibration_voltages'][i] = calib_val #store calibration voltage to .json file
                     print('Voltage Recorded = ', calib_val, 'V') #print median recorded voltage to screen for reference
-                break
-            elif choice in ['c','C']: print('\nCalibration cancelled.\n');return 0
-            else: print("\nError. Please press 'y' to confirm or 'c' to cancel.")
+                    break
+                elif choice in ['c','C']: print('\nCalibration cancelled.\n');return 0
+                else: print("\nError. Please press 'y' to confirm or 'c' to cancel.")
 
     #close out ultrasonic sensor calibration
     print("\nUltrasonic sensor calibration complete.\n") 
     config_data['ultrasonic']['calibration_date'] = datetime.now(ZoneInfo("America/Denver")).isoformat() # Update the date in the JSON data
-    with open('config.json', 'w') as f: json.dump(config_data, f, indent=4) # Write the updated JSON data back to the file
+    save_config()
     return 0
 
 def calibrate_load_cell():
-    os.system('cls') #clear terminal
+    clear_terminal() #clear terminal
     print("Calibrating load cell.\nPosition load cell in vertical orientation.")
     
-    for i in range(len(config_data['load_cell']['calibration_masses_kg'])):
-        while True:
-            print("\nPlace",config_data['load_cell']['calibration_masses_kg'][i]*1000,"g on load cell.")
-            choice = input("Press 'y' when ready or 'c' to cancel: ").strip()
-            
-            # get 1 second of data from DAQ for calibration
-            if choice.lower() == "exit": print("\nExiting program.\n"); exit()  # Close program
-            elif choice in ['y', 'Y']: 
-                with nidaqmx.Task() as task:
-                    freq = np.round(config_data['load_cell']['calibration_frequency_hz']).astype(int) #get desired frequency from input file
-                    task.ai_channels.add_ai_voltage_chan("myDAQ1/ai0") #create task to record load cell voltage
-                    task.timing.cfg_samp_clk_timing(freq, samps_per_chan=freq) #configure task frequency and number of samples
-                    calib_val = np.median(np.array(task.read(freq))) #set calibration voltage to median of collected data
+    # Create the DAQ task once and reuse it for every calibration point
+    with nidaqmx.Task() as task:
+        freq = int(round(config_data['load_cell']['calibration_frequency_hz'])) #get desired frequency from input file
+        add_sensor_channel(task, 'load_cell') #create task to record load cell voltage
+        task.timing.cfg_samp_clk_timing(freq, samps_per_chan=freq) #configure task frequency and number of samples
+        reader = AnalogSingleChannelReader(task.in_stream)
+        samples = np.empty(freq, dtype=np.float64) #buffer reused for every calibration point
+
+        for i in range(len(config_data['load_cell']['calibration_masses_kg'])):
+            while True:
+                print("\nPlace",config_data['load_cell']['calibration_masses_kg'][i]*1000,"g on load cell.")
+                choice = input("Press 'y' when ready or 'c' to cancel: ").strip()
+                
+                # get 1 second of data from DAQ for calibration
+                if choice.lower() == "exit": print("\nExiting program.\n"); exit()  # Close program
+                elif choice in ['y', 'Y']: 
+                    reader.read_many_sample(samples, number_of_samples_per_channel=freq) #read straight into the buffer rather than through a Python list
+                    calib_val = fast_median(samples) #set calibration voltage to median of collected data
                     config_data['load_cell']['calibration_voltages'][i] = calib_val #store calibration voltage to .json file
                     print('Voltage Recorded = ', calib_val, 'V') #print median recorded voltage to screen for reference
-                break
-            elif choice in ['c','C']: print('\nCalibration cancelled.\n');return 0
-            else: print("\nError. Please press 'y' to confirm or 'c' to cancel.")
+                    break
+                elif choice in ['c','C']: print('\nCalibration cancelled.\n');return 0
+                else: print("\nError. Please press 'y' to confirm or 'c' to cancel.")
 
     #close out ultrasonic sensor calibration
     print("\nLoad cell calibration complete.\n") 
+    plt.figure("Load Cell Calibration") #separate window so the tensile test figures are not drawn over
     plt.plot(config_data['load_cell']['calibration_voltages'],config_data['load_cell']['calibration_masses_kg'])
     plt.show()
     config_data['load_cell']['calibration_date'] = datetime.now(ZoneInfo("America/Denver")).isoformat() # Update the date in the JSON data
-    with open('config.json', 'w') as f: json.dump(config_data, f, indent=4) # Write the updated JSON data back to the file
+    save_config()
     return 0
 
 def calibrate():
-    os.system('cls') #clear terminal
+    clear_terminal() #clear terminal
     print("Calibration selected.\n")
     
-    # Convert ISO 8601 string to datetime object
-    load_cell_date = datetime.fromisoformat(config_data['load_cell']['calibration_date'].replace("-7:00", ""))
-    ultrasonic_date = datetime.fromisoformat(config_data['ultrasonic']['calibration_date'].replace("-7:00", ""))
+    # Convert ISO 8601 string (including its UTC offset) to datetime object
+    load_cell_date = datetime.fromisoformat(config_data['load_cell']['calibration_date'])
+    ultrasonic_date = datetime.fromisoformat(config_data['ultrasonic']['calibration_date'])
     # Print formatted dates
     print("Load cell calibration last performed:", load_cell_date.strftime("%Y-%m-%d %H:%M:%S"))
     print("Ultrasonic sensor calibration last performed:", ultrasonic_date.strftime("%Y-%m-%d %H:%M:%S"), "\n")
 
     while True:
-        print("Select an option:")
-        print("1 - Calibrate Load Cell")
-        print("2 - Calibrate Ultrasonic Sensor")
-        print("3 - Exit Calibration")
+        print(calibration_menu_text)
 
         # User selects desired calibration option
         choice = input("Enter your choice (1/2/3): ").strip()
         if choice.lower() == "exit": print("\nExiting program.\n"); exit()  # Close program
-        elif choice == "1": calibrate_load_cell() # Load Cell Calibration
-        elif choice == "2": calibrate_ultrasonic() # Ultrasonic Calibration
         elif choice == "3": print("\nReturning to main menu.\n"); break # Exit Calibration Menu
-
+        elif choice in calibration_options: calibration_options[choice]() # Run selected calibration
         else: print("\nInvalid choice. Please enter 1, 2, or 3.\n")
     return 0
 
-# Calculate line of best fits to interpret data based off of calibration
-def calc_lines_of_best_fit():
-    f_load_cell = Polynomial.fit(np.array(config_data['load_cell']['calibration_voltages']),np.array(config_data['load_cell']['calibration_masses_kg'])*9.8, deg=1) #added factor to account for gravity (kg > N)
-    f_ultrasonic = Polynomial.fit(np.array(config_data['ultrasonic']['calibration_voltages']), np.array(config_data['ultrasonic']['calibration_distances_m']), deg=1)
-    return f_load_cell, f_ultrasonic
-
-def calc_uncertainty(type, y_value):
-    if type not in (0, 1, 3): raise ValueError("Invalid input: 'type' must be 0, 1, or 2.")
-    
-    f_load_cell, f_ultrasonic = calc_lines_of_best_fit()
-
-    # Select appropriate calibration data
-    if type == 0:
-        x = np.array(config_data['load_cell']['calibration_voltages'])
-        y_true = np.array(config_data['load_cell']['calibration_masses_kg']) * 9.8
-        f = f_load_cell
-    elif type == 1:
-        x = np.array(config_data['ultrasonic']['calibration_voltages'])
-        y_true = np.array(config_data['ultrasonic']['calibration_distances_m'])
-        f = f_ultrasonic
-
-    # Find the corresponding x_measured (inverse lookup)
-    x_measured = (y_value - f.coef[0]) / f.coef[1]  # Solve for x using y = m*x + b
-
-    y_pred = f(x) # Compute predicted values
-    residuals = y_pred - y_true #compute residual
+# Calibration menu text and options, built once rather than on every pass through the menu
+calibration_menu_text = "Select an option:\n1 - Calibrate Load Cell\n2 - Calibrate Ultrasonic Sensor\n3 - Exit Calibration"
+calibration_options = {"1": calibrate_load_cell, "2": calibrate_ultrasonic}
+
+# Get calibration points as hashable tuples of (voltages, physical values) so fits can be cached on them
+def calibration_points(type):
+    if type == 0: return tuple(config_data['load_cell']['calibration_voltages']), tuple(m * 9.8 for m in config_data['load_cell']['calibration_masses_kg']) #added factor to account for gravity (kg > N)
+    return tuple(config_data['ultrasonic']['calibration_voltages']), tuple(config_data['ultrasonic']['calibration_distances_m'])
+
+# Fit a line to calibration points, cached so the fit only reruns after a calibration changes the points
+@lru_cache(maxsize=4)
+def fit_calibration(voltages, values):
+    x = np.array(voltages); y = np.array(values)
+    x_mean, y_mean = np.mean(x), np.mean(y)
+    dx = x - x_mean # Centre the data first, calibration voltages can be nearly identical and raw sums would cancel
+    slope = np.sum(dx * (y - y_mean)) / np.sum(dx * dx) # Closed-form least squares, no need for an SVD solve on a degree 1 fit
+    intercept = y_mean - slope * x_mean
+    return slope, intercept
+
+# Regression statistics needed for uncertainty propagation
+RegressionStats = namedtuple('RegressionStats', ['slope', 'intercept', 'std_error', 'n', 'x_mean', 'x_var'])
+
+# Calculate regression statistics, cached on the calibration points like the fit
+@lru_cache(maxsize=4)
+def calc_regression_stats(voltages, values):
+    x = np.array(voltages)
+    slope, intercept = fit_calibration(voltages, values)
+    residuals = (slope * x + intercept) - np.array(values) #compute residual
     n = len(x) #number of values in line of best fit
     std_error = np.sqrt(np.sum(residuals**2) / (n - 2))  # Standard error of regression
     x_mean = np.mean(x) # Compute uncertainty propagation
     x_var = np.var(x, ddof=1)  # Variance of x (ddof=1 for sample variance)
-    uncertainty = std_error * np.sqrt(1 + (1/n) + ((x_measured - x_mean)**2 / ((n - 1) * x_var))) # Uncertainty formula for predicted values in a linear regression
+    return RegressionStats(slope, intercept, std_error, n, x_mean, x_var)
+
+# Calculate line of best fits to interpret data based off of calibration, returned as (slope, intercept) pairs
+def calc_lines_of_best_fit():
+    f_load_cell = fit_calibration(*calibration_points(0))
+    f_ultrasonic = fit_calibration(*calibration_points(1))
+    return f_load_cell, f_ultrasonic
+
+# Get the regression statistics for a sensor (0 = load cell, 1 = ultrasonic)
+def calc_uncertainty_params(type):
+    if type not in (0, 1): raise ValueError("Invalid input: 'type' must be 0 or 1.")
+    return calc_regression_stats(*calibration_points(type)) # Select appropriate calibration data
 
+# Apply the uncertainty formula to a single value or a whole trace of values
+def apply_uncertainty(params, y_value):
+    y_value = np.asarray(y_value)
+    x_measured = (y_value - params.intercept) / params.slope  # Find the corresponding x_measured (inverse lookup) by solving y = m*x + b
+    uncertainty = params.std_error * np.sqrt(1 + (1/params.n) + ((x_measured - params.x_mean)**2 / ((params.n - 1) * params.x_var))) # Uncertainty formula for predicted values in a linear regression
     return uncertainty
 
+def calc_uncertainty(type, y_value):
+    return apply_uncertainty(calc_uncertainty_params(type), y_value)
+
+# Raw acquisition buffer kept between tests, only reallocated when a longer test needs more room
+acquisition_buffer = np.empty(0, dtype=np.float64)
+
 def collect_data():
+    global acquisition_buffer
 
     # Define parameters
     sampling_rate = config_data['test_config']['sampling_rate_hz']  # Hz
@@ -233,42 +325,27 @@ def collect_data():
     num_samples = int((sampling_rate * test_duration_ms) / 1000)  # Convert duration to number of samples
     test_duration = test_duration_ms / 1000  # Convert to seconds
     print('Running tensile test with',sampling_rate,'Hz sampling rate for',test_duration,'s') #Print current settings to screen
-    load_cell_channel = config_data['DAQ_config']['DAQ_name']+"/"+config_data['DAQ_config']['load_cell_channel'] # Create variable to for NIDAQmx to reference
-    ultrasonic_channel = config_data['DAQ_config']['DAQ_name']+"/"+config_data['DAQ_config']['ultrasonic_channel'] # Create variable to for NIDAQmx to reference
 
-    # Acquire and log data
+    # Acquire data straight into a preallocated buffer (row 0 = load cell, row 1 = ultrasonic)
+    if acquisition_buffer.size < 2*num_samples: acquisition_buffer = np.empty(2*num_samples, dtype=np.float64)
+    data = acquisition_buffer[:2*num_samples].reshape(2, num_samples) # Contiguous view sized for this test, as the reader requires
     with nidaqmx.Task() as task:
-        task.ai_channels.add_ai_voltage_chan(load_cell_channel) #collect load cell data
-        task.ai_channels.add_ai_voltage_chan(ultrasonic_channel)  #collect ultraonic sensor data
+        add_sensor_channel(task, 'load_cell') #collect load cell data
+        add_sensor_channel(task, 'ultrasonic')  #collect ultraonic sensor data
         task.timing.cfg_samp_clk_timing(sampling_rate, sample_mode=AcquisitionType.FINITE, samps_per_chan=num_samples)
-        task.in_stream.configure_logging(
-            "TestData.tdms", LoggingMode.LOG_AND_READ, operation=LoggingOperation.CREATE_OR_REPLACE
-        )
-        task.read(READ_ALL_AVAILABLE)
-
-    # Read data from TDMS file and plot
-    with TdmsFile.open("TestData.tdms") as tdms_file:
-        group = tdms_file.groups()[0]  # Get the first (and only) group
-        raw_load_cell_data = np.array(group[load_cell_channel][:])
-        raw_ultrasonic_data = np.array(group[ultrasonic_channel][:])
-        time = np.linspace(0, test_duration, num_samples)
-
-    # Cleanup TDMS files
-    for file in ["TestData.tdms", "TestData.tdms_index"]:
-        if os.path.exists(file):
-            os.remove(file)
+        reader = AnalogMultiChannelReader(task.in_stream)
+        task.start()
+        reader.read_many_sample(data, number_of_samples_per_channel=num_samples, timeout=test_duration+5) #allow time for the full test plus margin
+    t_axis = np.arange(num_samples) / sampling_rate # Sample times in seconds, spaced by the true sample period
 
     # Calculate line of best fits to interpret data based off of calibration
-    f_load_cell, f_ultrasonic = calc_lines_of_best_fit() # Calculate line of best fits to interpret data based off of calibration
-    load_cell_data = f_load_cell(raw_load_cell_data)
-    load_cell_data = load_cell_data-np.mean(load_cell_data[0:10])
-    load_cell_data = moving_average(load_cell_data,5) #slightly smooth out load cell data to account for oscillations
-    ultrasonic_data = f_ultrasonic(raw_ultrasonic_data)
-    ultrasonic_data = ultrasonic_data-np.mean(ultrasonic_data[0:3])
-
-    '''# TEMPORARY FUNCTION TO BE DELETED
-    load_cell_data = raw_load_cell_data 
-    ultrasonic_data = raw_ultrasonic_data'''
+    slopes = np.array([[slope] for slope, intercept in calc_lines_of_best_fit()]) # One slope per channel, matching the rows of data
+    baselines = np.array([[np.mean(data[0, 0:10])], [np.mean(data[1, 0:3])]]) # Starting voltage of each channel, used to zero the data
+    np.subtract(data, baselines, out=data); np.multiply(data, slopes, out=data) #zero and convert both channels in place, the intercept cancels out of m*v+b - (m*v0+b)
+    load_cell_data, ultrasonic_data = data[0], data[1]
+    load_cell_data = moving_average(load_cell_data,5,out=load_cell_data) #slightly smooth out load cell data to account for oscillations, in place
+    load_cell_data = load_cell_data.astype(np.float32, copy=False) #16-bit DAQ data carries no precision beyond float32, halves memory for analysis and plotting
+    ultrasonic_data = ultrasonic_data.astype(np.float32, copy=False)
 
     # Print confirmation to terminal
     print('\nTest Complete.\n')
@@ -279,46 +356,49 @@ def collect_data():
     if ((np.max(ultrasonic_data)-np.min(ultrasonic_data))/np.max(ultrasonic_data)) < config_data['ultrasonic']['minimum_data_variation_warning']:
         print("Warning. Minimal variation observed in ultrasonic data. Error may have occured.\n")
 
-    return load_cell_data, ultrasonic_data, time  # Return as a tuple
+    return load_cell_data, ultrasonic_data, t_axis  # Return as a tuple
 
 # Compute velocity using a stable five-point finite difference method for non-uniform time steps.
-def calculate_velocity(ultrasonic_data, time):
+def calculate_velocity(ultrasonic_data, t_axis):
     n = len(ultrasonic_data)
     velocity = np.zeros_like(ultrasonic_data, dtype=float)  # Initialize velocity array
 
-    # Compute velocity for interior points using a five-point finite difference formula
-    for i in range(2, n - 2):
-        dt1 = time[i+1] - time[i]
-        dt2 = time[i-1] - time[i]
-        dt3 = time[i+2] - time[i]
-        dt4 = time[i-2] - time[i]
+    # Compute velocity for interior points using a five-point finite difference formula, applied to all interior points at once with array slices
+    if n > 4:
+        dt_inner = t_axis[3:n-1] - t_axis[1:n-3] # (t[i+1]-t[i]) - (t[i-1]-t[i]), with t[i] cancelled out
+        dt_outer = t_axis[4:n] - t_axis[0:n-4] # (t[i+2]-t[i]) - (t[i-2]-t[i]), with t[i] cancelled out
 
-        velocity[i] = (2 * (ultrasonic_data[i+1] - ultrasonic_data[i-1]) / (dt1 - dt2) + 
-                      (ultrasonic_data[i-2] - ultrasonic_data[i+2]) / (12 * (dt3 - dt4)))
+        velocity[2:n-2] = (2 * (ultrasonic_data[3:n-1] - ultrasonic_data[1:n-3]) / dt_inner + 
+                          (ultrasonic_data[0:n-4] - ultrasonic_data[4:n]) / (12 * dt_outer))
 
     # Use a three-point forward difference for first two points
-    velocity[0] = (ultrasonic_data[1] - ultrasonic_data[0]) / (time[1] - time[0])
-    velocity[1] = (ultrasonic_data[2] - ultrasonic_data[1]) / (time[2] - time[1])
+    velocity[0] = (ultrasonic_data[1] - ultrasonic_data[0]) / (t_axis[1] - t_axis[0])
+    velocity[1] = (ultrasonic_data[2] - ultrasonic_data[1]) / (t_axis[2] - t_axis[1])
 
     # Use a three-point backward difference for last two points
-    velocity[-1] = (ultrasonic_data[-1] - ultrasonic_data[-2]) / (time[-1] - time[-2])
-    velocity[-2] = (ultrasonic_data[-2] - ultrasonic_data[-3]) / (time[-2] - time[-3])
+    velocity[-1] = (ultrasonic_data[-1] - ultrasonic_data[-2]) / (t_axis[-1] - t_axis[-2])
+    velocity[-2] = (ultrasonic_data[-2] - ultrasonic_data[-3]) / (t_axis[-2] - t_axis[-3])
 
     return velocity
 
-def process_data(load_cell_data, ultrasonic_data, velocity, time):
+def process_data(load_cell_data, ultrasonic_data, velocity, t_axis):
 
     # Find duration of tensile test
-    test_start_threshold = load_cell_data[0]+0.05*(np.max(load_cell_data)-load_cell_data[0]) #identify 5% rise in force, signifying start of tensile test
-    test_start_index = np.where(load_cell_data > test_start_threshold)[0][0] #find index of 5% rise in force, signifying start of tensile test
-    sample_break_index = np.argmax(load_cell_data) #Find index where max force occurs and sample breaks
+    sample_break_index = int(np.argmax(load_cell_data)) #Find index where max force occurs and sample breaks
+    max_force = load_cell_data[sample_break_index] #Reuse the argmax result rather than scanning the data again with np.max
+    test_start_threshold = load_cell_data[0]+0.05*(max_force-load_cell_data[0]) #identify 5% rise in force, signifying start of tensile test
+    above_threshold = load_cell_data > test_start_threshold
+    test_start_index = int(np.argmax(above_threshold)) #find index of 5% rise in force, signifying start of tensile test (argmax stops at the first True)
+    if not above_threshold[test_start_index]: test_start_index = 0 #no rise in force found (flat data), fall back to the start of the recording
 
     # Find desired values from test (max force, breaking displacement, etc.)
-    max_force = np.max(load_cell_data)
     displacement_at_break = ultrasonic_data[sample_break_index]
     displacement_at_break_uncertainty = calc_uncertainty(1,displacement_at_break)
     velocity_at_break = velocity[sample_break_index]
-    average_velocity = np.mean(velocity[test_start_index:sample_break_index])
+    if test_start_index >= sample_break_index: # No samples between test start and break (e.g. max force at the first sample)
+        print("Warning. No data between test start and sample break. Average velocity unavailable.\n")
+        average_velocity = float('nan')
+    else: average_velocity = np.mean(velocity[test_start_index:sample_break_index])
     
     #Print desired values to terminal
     print(f"Max Force = {max_force:.2f} N")
@@ -328,14 +408,14 @@ def process_data(load_cell_data, ultrasonic_data, velocity, time):
 
     return max_force, displacement_at_break, velocity_at_break, average_velocity
 
-def export_data(load_cell_data, ultrasonic_data, velocity, time, max_force, displacement_at_break, velocity_at_break, average_velocity):
+def export_data(load_cell_data, ultrasonic_data, velocity, t_axis, max_force, displacement_at_break, velocity_at_break, average_velocity):
     # Get current time and format it
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     # Create filename with timestamp
     filename = f"tensile_test_data_{timestamp}.csv"
 
-    # Open file and write summary data
+    # Open file once and write summary data followed by the data table
     with open(filename, 'w') as file:
         file.write(f"Time, {timestamp}\n") 
         file.write(f"Test Duration (s), {(config_data['test_config']['test_duration_ms']/1000):.2f}\n") 
@@ -346,27 +426,53 @@ def export_data(load_cell_data, ultrasonic_data, velocity, time, max_force, disp
         file.write(f"Average Velocity (m/s), {average_velocity:.6f}\n\n")  # Extra newline for readability
         file.write("Time (s), Force (N), Displacement (m), Velocity (m/s)\n")  # Column headers
 
-    # Stack arrays column-wise
-    data = np.column_stack((time, load_cell_data, ultrasonic_data, velocity))
+        # Stack arrays column-wise
+        data = np.column_stack((t_axis, load_cell_data, ultrasonic_data, velocity))
 
-    # Append data table to the file
-    with open(filename, 'a') as file:
-        np.savetxt(file, data, delimiter=",", fmt="%.6f")
+        # Write data table in blocks, formatting each block with one string operation instead of one per row as np.savetxt does
+        row_format = "%.6f,%.6f,%.6f,%.6f\n"
+        for start in range(0, len(data), 10000):
+            block = data[start:start+10000]
+            file.write((row_format * len(block)) % tuple(block.ravel().tolist()))
 
     print("\nData exported to", filename, "\n")
     return 0
 
-def plot_data(load_cell_data, ultrasonic_data, velocity, time):
+# Figures and lines from the previous test, kept so repeat tests only update the plotted data
+plot_handles = {}
+
+def plot_data(load_cell_data, ultrasonic_data, velocity, t_axis):
 
     plt.ion() # Create interactive figures
 
+    # Decimate each series to roughly screen resolution before handing it to matplotlib
+    time_force, plot_force = minmax_decimate(t_axis, load_cell_data)
+    time_displacement, plot_displacement = minmax_decimate(t_axis, ultrasonic_data)
+    displacement_velocity, plot_velocity = minmax_decimate(ultrasonic_data, velocity)
+
+    # Reuse the figures from the previous test if they are still open
+    if plot_handles and plt.fignum_exists(plot_handles['time_fig'].number) and plt.fignum_exists(plot_handles['displacement_fig'].number):
+        plot_handles['force_line'].set_data(time_force, plot_force)
+        plot_handles['displacement_line'].set_data(time_displacement, plot_displacement)
+        plot_handles['velocity_line'].set_data(displacement_velocity, plot_velocity)
+        for ax in (plot_handles['time_ax'], plot_handles['velocity_ax']): ax.set_autoscale_on(True); ax.relim(); ax.autoscale_view() # Toolbar zoom/pan turns autoscale off, so re-enable it before rescaling to the new data
+        for fig in (plot_handles['time_fig'], plot_handles['displacement_fig']):
+            toolbar = getattr(fig.canvas, 'toolbar', None)
+            if toolbar is not None: toolbar.update() # Clear the zoom/pan history so Home returns to this test's view
+            fig.canvas.draw_idle()
+        plt.show()
+        return 0
+    for fig in (plot_handles.get('time_fig'), plot_handles.get('displacement_fig')): # One window was closed, rebuild both
+        if fig is not None: plt.close(fig)
+
     # Create figure plotting data as a function of time
-    plt.figure("Data Over Time")
-    plt.plot(time,load_cell_data, label = "Force (N)")
-    plt.plot(time,ultrasonic_data, label = "Displacement (m)")
-    #plt.plot(time, velocity, label = "Velocity (m/s)")
-    plt.xlabel("Time (s)")
-    plt.legend()
+    time_fig = plt.figure("Data Over Time")
+    time_ax = time_fig.gca()
+    force_line, = time_ax.plot(time_force,plot_force, label = "Force (N)")
+    displacement_line, = time_ax.plot(time_displacement,plot_displacement, label = "Displacement (m)")
+    #time_ax.plot(t_axis, velocity, label = "Velocity (m/s)")
+    time_ax.set_xlabel("Time (s)")
+    time_ax.legend()
 
     # Create figure plotting data as function of distance
     fig, ax1 = plt.subplots(figsize=(8, 4)) # Create the figure and first axis
@@ -380,15 +486,16 @@ def plot_data(load_cell_data, ultrasonic_data, velocity, time):
     
     # Create a second y-axis sharing the same x-axis
     ax2 = ax1.twinx()
-    ax2.plot(ultrasonic_data, velocity, label="Velocity (m/s)", color='r')
+    velocity_line, = ax2.plot(displacement_velocity, plot_velocity, label="Velocity (m/s)", color='r')
     ax2.set_ylabel("Velocity (m/s)", color='r')
     ax2.tick_params(axis='y', labelcolor='r')
     plt.show()
 
+    plot_handles.update(time_fig=time_fig, time_ax=time_ax, force_line=force_line, displacement_line=displacement_line, displacement_fig=fig, velocity_ax=ax2, velocity_line=velocity_line)
     return 0
 
 def tensile_test():
-    os.system('cls') #clear terminal
+    clear_terminal() #clear terminal
     
     # Print options for user
     while True:
@@ -407,27 +514,39 @@ def tensile_test():
     print("\nProceeding with data collection...\n")
 
     # Call function to perform main actions of tensile test
-    load_cell_data, ultrasonic_data, time = collect_data() #Call function to collect data 
-    velocity = moving_average(calculate_velocity(ultrasonic_data, time),11) #import preprepared data from file
-    max_force, displacement_at_break, velocity_at_break, average_velocity = process_data(load_cell_data, ultrasonic_data, velocity, time) #Call function to process data  
-    export_data(load_cell_data, ultrasonic_data, velocity, time, max_force, displacement_at_break, velocity_at_break, average_velocity) #Call function to export data  
-    plot_data(load_cell_data, ultrasonic_data, velocity, time) #Call function to visualize data
-
-    input("Press Enter to return to main menu...")
-    plt.close('all') #close all open plots
+    load_cell_data, ultrasonic_data, t_axis = collect_data() #Call function to collect data 
+    velocity = moving_average(calculate_velocity(ultrasonic_data, t_axis),11) #import preprepared data from file
+    max_force, displacement_at_break, velocity_at_break, average_velocity = process_data(load_cell_data, ultrasonic_data, velocity, t_axis) #Call function to process data  
+    export_data(load_cell_data, ultrasonic_data, velocity, t_axis, max_force, displacement_at_break, velocity_at_break, average_velocity) #Call function to export data
+    plot_data(load_cell_data, ultrasonic_data, velocity, t_axis) #Call function to visualize data
+
+    input("Press Enter to return to main menu...") #plots are left open and updated in place by the next test
     
     return 0
 
-# Main Menu Selection
-while True:
-    os.system('cls') #clear terminal
-    print("Welcome to the High-Speed Tensile Tester.\n")
-    print("Select an option:"); print("1 - Tensile Testing"); print("2 - Calibration"); print("3 - Settings"); print("4 - Exit Program")
-    choice = input("Enter your choice (1/2/3/4): ").strip()
-    
-    # Main Menu Options
-    if choice == "1": tensile_test()
-    elif choice == "2": calibrate()
-    elif choice == "3": settings()
-    elif choice.lower() == "4" or "exit": print("\nExiting program.\n"); exit()
-    else: print("\nInvalid choice. Please enter 1, 2, or 3.\n"); time.sleep(1)
+def exit_program():
+    print("\nExiting program.\n"); exit()
+
+def invalid_main_menu_choice():
+    print("\nInvalid choice. Please enter 1, 2, 3, or 4.\n"); time.sleep(1)
+
+# Main menu text and options, built once rather than on every pass through the menu
+main_menu_text = "Welcome to the High-Speed Tensile Tester.\n\nSelect an option:\n1 - Tensile Testing\n2 - Calibration\n3 - Settings\n4 - Exit Program"
+main_menu_options = {"1": tensile_test, "2": calibrate, "3": settings, "4": exit_program, "exit": exit_program}
+
+def main():
+    os.system('') #run an empty command once so the Windows terminal processes ANSI escape codes
+    clear_terminal() #clear terminal
+    load_config()
+
+    # Main Menu Selection
+    while True:
+        clear_terminal() #clear terminal
+        print(main_menu_text)
+        choice = input("Enter your choice (1/2/3/4): ").strip()
+        
+        # Main Menu Options
+        main_menu_options.get(choice.lower(), invalid_main_menu_choice)()
+
+if __name__ == "__main__":
+    main()